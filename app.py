@@ -1,12 +1,15 @@
 import os
+import fcntl
 import logging
 import secrets
 from dotenv import load_dotenv
 from flask import Flask, render_template, jsonify, request, session, redirect, url_for
+from flask.json.provider import DefaultJSONProvider
+from flask_sock import Sock
 import threading
 from datetime import datetime
-import pandas as pd
-from trading_bot import TradingBot, state
+import orjson
+from trading_bot import TradingBot, state, state_lock, snapshot_state, format_trade, trade_rows, pop_trade, empty_trades, notify_state_changed, wait_state_changed, OHLCV_TS, OHLCV_OPEN, OHLCV_HIGH, OHLCV_LOW, OHLCV_CLOSE
 from telegram_notifications import TelegramNotifier
 
 # Загружаем переменные окружения из .env файла
@@ -18,7 +21,22 @@ logging.basicConfig(
     datefmt='%Y-%m-%d %H:%M:%S'
 )
 
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON для jsonify и app.json через orjson; нестандартные типы - как у провайдера Flask по умолчанию"""
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=self.option), mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Генерируем безопасный случайный ключ если SESSION_SECRET не установлен
 SESSION_SECRET = os.getenv('SESSION_SECRET')
@@ -27,6 +45,14 @@ if not SESSION_SECRET:
     logging.warning("⚠️  SESSION_SECRET не установлен! Используется случайно сгенерированный ключ. Установите SESSION_SECRET в секретах для постоянства сессий между перезапусками.")
 
 app.secret_key = SESSION_SECRET
+sock = Sock(app)
+
+# Максимальная пауза между push-обновлениями статуса по WebSocket (секунды)
+WS_STATUS_TIMEOUT = 30
+# Каждое открытое WebSocket-соединение занимает поток gunicorn (--threads 32).
+# Лимит оставляет потоки для REST и кнопок управления; сверх лимита клиенты опрашивают /api/status
+WS_MAX_CLIENTS = 16
+ws_slots = threading.BoundedSemaphore(WS_MAX_CLIENTS)
 
 # Глобальные переменные
 bot_instance = None
@@ -52,16 +78,19 @@ def bot_main_loop():
     global bot_running, bot_instance
     
     try:
-        bot_instance = TradingBot(telegram_notifier=telegram_notifier)
-        logging.info("Trading bot initialized")
+        # Экземпляр переиспользуется между запусками: у него свой event loop и клиент биржи
+        if bot_instance is None:
+            bot_instance = TradingBot(telegram_notifier=telegram_notifier)
+            logging.info("Trading bot initialized")
         
         def should_continue():
             return bot_running
         
-        bot_instance.strategy_loop(should_continue=should_continue)
+        bot_instance.run_sync(bot_instance.strategy_loop(should_continue=should_continue), timeout=None)
     except Exception as e:
         logging.error(f"Bot error: {e}")
         bot_running = False
+        notify_state_changed()
 
 @app.route('/')
 def index():
@@ -102,38 +131,58 @@ def fetch_mexc_payouts():
         logging.error(f"Error fetching MEXC payouts: {e}")
         return {'BTC': {'up': '80%', 'down': '80%'}, 'ETH': {'up': '80%', 'down': '80%'}}
 
+def candle_time(row):
+    """Время открытия свечи (UTC) в формате HH:MM - для отладочных и графических маршрутов"""
+    return datetime.utcfromtimestamp(row[OHLCV_TS] / 1000).strftime('%H:%M')
+
+def build_status():
+    """Снапшот статуса бота для /api/status и /ws/status (только из кэша, без запросов к бирже)"""
+    # Направления SAR и цена берутся из последнего тика стратегии
+    state = snapshot_state()
+    directions = state.get('sar_directions', {tf: None for tf in ['1m', '5m', '30m']})
+    current_price = bot_instance.get_cached_price() if bot_instance else 3000.0
+    
+    return {
+        'bot_running': bot_running,
+        'paper_mode': os.getenv('RUN_IN_PAPER', '1') == '1',
+        'balance': state.get('balance', 1000),
+        'available': state.get('available', 1000),
+        'in_position': state.get('in_position', False),
+        'position': state.get('position'),
+        'current_price': current_price,
+        'directions': directions,
+        'sar_directions': directions,
+        'trades': [format_trade(t) for t in trade_rows(state['trades'])]
+    }
+
 @app.route('/api/status')
 def api_status():
-    """Получение текущего статуса бота"""
+    """Получение текущего статуса бота (fallback для клиентов без WebSocket)"""
     try:
-        # Получаем текущие направления SAR
-        directions = {}
-        if bot_instance:
-            directions = bot_instance.get_current_directions()
-        
-        # Если bot_instance еще не вернул данные, пробуем взять из state
-        if not directions or all(v is None for v in directions.values()):
-            directions = state.get('sar_directions', {tf: None for tf in ['1m', '5m', '30m']})
-        
-        # Получаем текущую цену
-        current_price = bot_instance.get_current_price() if bot_instance else 3000.0
-        
-        return jsonify({
-            'bot_running': bot_running,
-            'paper_mode': os.getenv('RUN_IN_PAPER', '1') == '1',
-            'balance': state.get('balance', 1000),
-            'available': state.get('available', 1000),
-            'in_position': state.get('in_position', False),
-            'position': state.get('position'),
-            'current_price': current_price,
-            'directions': directions,
-            'sar_directions': directions,
-            'trades': state.get('trades', [])
-        })
+        return jsonify(build_status())
     except Exception as e:
         logging.error(f"Status error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@sock.route('/ws/status')
+def ws_status(ws):
+    """WebSocket: статус при подключении и при каждом изменении состояния"""
+    if not ws_slots.acquire(blocking=False):
+        ws.close(reason=1013, message='Too many status connections')
+        return
+    try:
+        version = None
+        while True:
+            version = wait_state_changed(version, WS_STATUS_TIMEOUT)
+            try:
+                payload = app.json.dumps(build_status())
+            except Exception as e:
+                logging.error(f"Status push error: {e}")
+                continue
+            ws.send(payload)
+    finally:
+        ws_slots.release()
+
 @app.route('/api/start_bot', methods=['POST'])
 def api_start_bot():
     """Запуск торгового бота"""
@@ -146,6 +195,7 @@ def api_start_bot():
         bot_running = True
         bot_thread = threading.Thread(target=bot_main_loop, daemon=True)
         bot_thread.start()
+        notify_state_changed()
         
         logging.info("Trading bot started")
         return jsonify({'message': 'Бот успешно запущен', 'status': 'running'})
@@ -164,6 +214,7 @@ def api_stop_bot():
     
     try:
         bot_running = False
+        notify_state_changed()
         logging.info("Trading bot stopped")
         return jsonify({'message': 'Бот успешно остановлен', 'status': 'stopped'})
     except Exception as e:
@@ -173,14 +224,14 @@ def api_stop_bot():
 @app.route('/api/close_position', methods=['POST'])
 def api_close_position():
     """Принудительное закрытие позиции"""
-    if not state.get('in_position'):
+    if not state.in_position:
         return jsonify({'error': 'Нет открытой позиции'}), 400
     
     try:
         if bot_instance:
-            trade = bot_instance.close_position(close_reason='manual')
+            trade = bot_instance.run_sync(bot_instance.close_position(close_reason='manual'))
             if trade:
-                return jsonify({'message': 'Позиция успешно закрыта', 'trade': trade})
+                return jsonify({'message': 'Позиция успешно закрыта', 'trade': format_trade(trade)})
             else:
                 return jsonify({'error': 'Ошибка закрытия позиции'}), 500
         else:
@@ -202,7 +253,7 @@ def api_send_test_message():
 Бот работает корректно и готов к отправке уведомлений!
 
 ⏰ Время: {datetime.utcnow().strftime("%H:%M:%S UTC")}
-💰 Баланс: ${state.get('balance', 0):.2f}
+💰 Баланс: ${state.balance:.2f}
         """.strip()
         
         success = telegram_notifier.send_message(message)
@@ -238,18 +289,17 @@ def api_debug_sar():
     try:
         debug_data = {
             'timestamp': datetime.utcnow().isoformat(),
-            'current_price': bot_instance.get_current_price(),
+            'current_price': bot_instance.run_sync(bot_instance.get_current_price()),
             'sar_data': {}
         }
         
         for tf in ['30m', '5m', '1m']:
-            df = bot_instance.fetch_ohlcv_tf(tf, limit=50)
-            if df is not None and len(df) > 0:
-                psar = bot_instance.compute_psar(df)
-                direction = bot_instance.get_direction_from_psar(df)
-                
-                last_close = df['close'].iloc[-1]
-                last_psar = psar.iloc[-1] if psar is not None else 0
+            ohlcv = bot_instance.run_sync(bot_instance.fetch_ohlcv_tf(tf, limit=50, copy=True))
+            if ohlcv is not None and len(ohlcv) > 0:
+                psar = bot_instance.compute_psar_series(ohlcv)
+                direction = bot_instance.last_psar_direction(ohlcv)
+                last_close = ohlcv[-1, OHLCV_CLOSE]
+                last_psar = psar[-1] if psar is not None else 0
                 
                 debug_data['sar_data'][tf] = {
                     'direction': direction,
@@ -258,13 +308,13 @@ def api_debug_sar():
                     'close_vs_psar': f"{(last_close - last_psar):.2f}",
                     'last_candles': [
                         {
-                            'time': pd.to_datetime(row['datetime']).strftime('%H:%M'),
-                            'open': f"{row['open']:.2f}",
-                            'high': f"{row['high']:.2f}",
-                            'low': f"{row['low']:.2f}",
-                            'close': f"{row['close']:.2f}"
+                            'time': candle_time(row),
+                            'open': f"{row[OHLCV_OPEN]:.2f}",
+                            'high': f"{row[OHLCV_HIGH]:.2f}",
+                            'low': f"{row[OHLCV_LOW]:.2f}",
+                            'close': f"{row[OHLCV_CLOSE]:.2f}"
                         }
-                        for _, row in df.tail(5).iterrows()
+                        for row in ohlcv[-5:]
                     ]
                 }
             else:
@@ -280,10 +330,10 @@ def api_get_global_state():
     """Получение глобального состояния для Telegram бота"""
     return jsonify({
         'bot_running': bot_running,
-        'balance': state.get('balance', 1000),
-        'available': state.get('available', 1000),
-        'in_position': state.get('in_position', False),
-        'current_price': bot_instance.get_current_price() if bot_instance else 3000.0
+        'balance': state.balance,
+        'available': state.available,
+        'in_position': state.in_position,
+        'current_price': bot_instance.get_cached_price() if bot_instance else 3000.0
     })
 
 @app.route('/api/chart_data')
@@ -298,9 +348,9 @@ def api_chart_data():
             })
         
         # Get last 50 candles (50 minutes of 1m data) for larger candlesticks
-        df = bot_instance.fetch_ohlcv_tf('1m', limit=50)
+        ohlcv = bot_instance.run_sync(bot_instance.fetch_ohlcv_tf('1m', limit=50, copy=True))
         
-        if df is None or len(df) == 0:
+        if ohlcv is None or len(ohlcv) == 0:
             return jsonify({
                 'candles': [],
                 'markers': []
@@ -308,21 +358,22 @@ def api_chart_data():
         
         # Prepare candle data
         candles = []
-        for _, row in df.iterrows():
+        for row in ohlcv:
             candles.append({
-                'time': pd.to_datetime(row['datetime']).strftime('%H:%M'),
-                'open': float(row['open']),
-                'high': float(row['high']),
-                'low': float(row['low']),
-                'close': float(row['close'])
+                'time': candle_time(row),
+                'open': float(row[OHLCV_OPEN]),
+                'high': float(row[OHLCV_HIGH]),
+                'low': float(row[OHLCV_LOW]),
+                'close': float(row[OHLCV_CLOSE])
             })
         
         # Get trade markers (entry/exit points)
         # Match by time string (HH:MM) instead of exact timestamp
         markers = []
-        recent_trades = state.get('trades', [])[-20:]  # Last 20 trades
+        with state_lock:
+            recent_trades = trade_rows(state.trades)[-20:]  # Last 20 trades
         
-        for trade in recent_trades:
+        for trade in map(format_trade, recent_trades):
             # Try different field names for entry time
             entry_time_str = trade.get('entry_time') or trade.get('time')
             if entry_time_str:
@@ -348,8 +399,8 @@ def api_chart_data():
                     })
         
         # Current position marker
-        if state.get('in_position') and state.get('position'):
-            pos = state['position']
+        if state.in_position and state.position:
+            pos = state.position
             entry_time_str = pos.get('entry_time')
             if entry_time_str:
                 entry_time = datetime.fromisoformat(entry_time_str)
@@ -376,19 +427,20 @@ def api_chart_data():
 def api_delete_last_trade():
     """Delete the last trade from history"""
     try:
-        trades = state.get('trades', [])
-        if len(trades) == 0:
-            return jsonify({'error': 'No trades to delete'}), 400
-        
-        deleted_trade = trades.pop()
-        state['trades'] = trades
+        with state_lock:
+            trades = state.trades
+            if len(trades['side']) == 0:
+                return jsonify({'error': 'No trades to delete'}), 400
+            
+            deleted_trade = pop_trade(trades)
         
         # Save state
         if bot_instance:
             bot_instance.save_state_to_file()
+        notify_state_changed()
         
         logging.info(f"Deleted last trade: {deleted_trade}")
-        return jsonify({'message': 'Last trade deleted successfully', 'deleted_trade': deleted_trade})
+        return jsonify({'message': 'Last trade deleted successfully', 'deleted_trade': format_trade(deleted_trade)})
     except Exception as e:
         logging.error(f"Delete trade error: {e}")
         return jsonify({'error': str(e)}), 500
@@ -397,18 +449,19 @@ def api_delete_last_trade():
 def api_reset_balance():
     """Reset balance to $100 and reset trade counter"""
     try:
-        state['balance'] = 100.0
-        state['available'] = 100.0
-        state['in_position'] = False
-        state['position'] = None
-        state['trades'] = []
-        # Reset trade counter to start from 1
-        if 'telegram_trade_counter' in state:
-            del state['telegram_trade_counter']
+        with state_lock:
+            state.balance = 100.0
+            state.available = 100.0
+            state.in_position = False
+            state.position = None
+            state.trades = empty_trades()
+            # Reset trade counter to start from 1
+            state.telegram_trade_counter = 0
         
         # Save state
         if bot_instance:
             bot_instance.save_state_to_file()
+        notify_state_changed()
         
         logging.info("Balance reset to $100 and trade counter reset")
         return jsonify({'message': 'Balance reset to $100, trades cleared, counter reset to 1', 'balance': 100.0})
@@ -423,9 +476,9 @@ def api_send_current_position():
         if not telegram_notifier:
             return jsonify({'error': 'Telegram not configured'}), 400
         
-        current_price = bot_instance.get_current_price() if bot_instance else 0
-        position = state.get('position')
-        balance = state.get('balance', 0)
+        current_price = bot_instance.run_sync(bot_instance.get_current_price()) if bot_instance else 0
+        position = state.position
+        balance = state.balance
         
         telegram_notifier.send_current_position(position, current_price, balance)
         
@@ -471,15 +524,41 @@ def telegram_webhook():
     
     return 'OK', 200
 
-# Инициализация Telegram при загрузке модуля
-init_telegram()
+TG_SETUP_LOCK = '/tmp/tg_setup.lock'
+tg_setup_lock_file = None
+
+def setup_webapp_background():
+    """Настройка Telegram WebApp в фоне; выполняет только процесс, захвативший файловую блокировку"""
+    global tg_setup_lock_file
+    try:
+        lock_file = open(TG_SETUP_LOCK, 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        logging.info("Telegram WebApp setup is handled by another process")
+        return
+    # Блокировка держится до конца жизни процесса - соседние и перезапущенные воркеры не шлют приветствие повторно
+    tg_setup_lock_file = lock_file
+    
+    try:
+        from telegram_bot_handler import setup_telegram_webapp
+        setup_telegram_webapp()
+    except Exception as e:
+        logging.error(f"Failed to setup Telegram WebApp: {e}")
+
+def init_app_once():
+    """Однократная инициализация процесса (Telegram уведомления и WebApp)"""
+    if app.config.get('INITED'):
+        return
+    app.config['INITED'] = True
+    
+    # Без сетевых запросов - выполняется сразу
+    init_telegram()
+    
+    # Запросы к Telegram API не задерживают импорт и готовность воркера
+    threading.Thread(target=setup_webapp_background, daemon=True).start()
 
-# Настройка Telegram WebApp
-try:
-    from telegram_bot_handler import setup_telegram_webapp
-    setup_telegram_webapp()
-except Exception as e:
-    logging.error(f"Failed to setup Telegram WebApp: {e}")
+# Инициализация при загрузке модуля (и под gunicorn, и при запуске напрямую)
+init_app_once()
 
 @app.route('/trade/start', methods=['POST'])
 def trade_start_webhook():
@@ -500,10 +579,11 @@ def api_test_trades():
     return jsonify({
         "status": "success",
         "message": "Test webhook received",
-        "received_args": args
+        "received_args": args.to_dict()
     })
 
 if __name__ == '__main__':
-    # Запуск Flask приложения
+    # Запуск встроенного сервера Flask для разработки.
+    # В продакшене: gunicorn -k gthread -w 1 --threads 32 -b 0.0.0.0:$PORT app:app
     port = int(os.getenv('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
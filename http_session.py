@@ -0,0 +1,20 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def create_session(pool_connections=4, pool_maxsize=8, max_retries=None):
+    """
+    HTTP-сессия с пулом keep-alive соединений и повторами при сетевых сбоях,
+    чтобы не проходить TLS-рукопожатие на каждый запрос
+    """
+    if max_retries is None:
+        max_retries = Retry(total=3, backoff_factor=0.3)
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=max_retries,
+    )
+    session.mount("https://", adapter)
+    return session
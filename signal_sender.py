@@ -1,5 +1,6 @@
-import requests
 import logging
+from urllib3.util.retry import Retry
+from http_session import create_session
 
 class SignalSender:
     """Отправка торговых сигналов GET на ngrok для ETH_USDT (Ставка 5)"""
@@ -11,6 +12,10 @@ class SignalSender:
         # Целевой URL для ETH_USDT (Event Futures)
         self.target_url = "https://www.mexc.com/ru-RU/futures/event-futures/ETH_USDT"
         
+        # Постоянное соединение с мостом вместо нового TLS-рукопожатия на каждый сигнал.
+        # Повторяем только ошибки соединения: после отправки запроса повтор может продублировать ставку
+        self.session = create_session(max_retries=Retry(total=3, read=0, status=0, backoff_factor=0.3))
+        
     def send_signal(self, direction: str):
         """
         direction: 'Up' (Рост) или 'Down' (Падение)
@@ -27,7 +32,7 @@ class SignalSender:
             logging.info(f"🛰 Отправка сигнала: {direction} (Сумма: 5)")
             
             # Выполнение GET запроса
-            response = requests.get(self.base_url, params=params, timeout=15)
+            response = self.session.get(self.base_url, params=params, timeout=15)
             
             # Логируем итоговую ссылку для визуальной проверки
             logging.info(f"🔗 Ссылка: {response.url}")
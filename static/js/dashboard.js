@@ -145,8 +145,16 @@ class TradingDashboard {
                 return;
             }
 
-            const data = await response.json();
+            this.renderStatus(await response.json());
+        } catch (error) {
+            console.error('Dashboard update error:', error);
+        } finally {
+            this.isUpdating = false;
+        }
+    }
 
+    renderStatus(data) {
+        try {
             // Update bot status
             const statusBadge = document.getElementById('bot-status');
             if (data.bot_running) {
@@ -188,8 +196,6 @@ class TradingDashboard {
             this.lastUpdateTime = new Date();
         } catch (error) {
             console.error('Dashboard update error:', error);
-        } finally {
-            this.isUpdating = false;
         }
     }
 
@@ -406,11 +412,49 @@ class TradingDashboard {
     }
 
     startDataUpdates() {
+        // Status is pushed over a WebSocket; /api/status polling is the fallback
+        this.pollTimer = null;
+        this.reconnectDelay = 5000;
+        this.connectStatusSocket();
+    }
+
+    connectStatusSocket() {
+        if (!('WebSocket' in window)) {
+            this.startPolling();
+            return;
+        }
+
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(`${protocol}//${window.location.host}/ws/status`);
+
+        socket.onopen = () => this.stopPolling();
+        socket.onmessage = (event) => {
+            this.reconnectDelay = 5000;
+            this.renderStatus(JSON.parse(event.data));
+        };
+        socket.onclose = (event) => {
+            // Fall back to polling; 1013 means the server is full, so stay on polling
+            this.startPolling();
+            if (event.code === 1013) return;
+            // Otherwise reconnect, backing off up to a minute while the socket keeps failing
+            setTimeout(() => this.connectStatusSocket(), this.reconnectDelay);
+            this.reconnectDelay = Math.min(this.reconnectDelay * 2, 60000);
+        };
+    }
+
+    startPolling() {
+        if (this.pollTimer) return;
         // Update dashboard every 3 seconds
-        setInterval(() => {
+        this.pollTimer = setInterval(() => {
             this.updateDashboard();
         }, 3000);
     }
+
+    stopPolling() {
+        if (!this.pollTimer) return;
+        clearInterval(this.pollTimer);
+        this.pollTimer = null;
+    }
 }
 
 // Initialize dashboard when DOM is loaded
@@ -1,7 +1,7 @@
 import os
 import logging
-import requests
 from dotenv import load_dotenv
+from http_session import create_session
 
 load_dotenv()
 
@@ -21,6 +21,7 @@ class TelegramBotHandler:
             return
         
         self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
+        self.session = create_session()
         logging.info("Telegram bot handler initialized")
     
     def setup_webapp_button(self):
@@ -55,7 +56,7 @@ class TelegramBotHandler:
                 }
             ]
             
-            commands_response = requests.post(
+            commands_response = self.session.post(
                 f"{self.base_url}/setMyCommands",
                 json={"commands": commands},
                 timeout=10
@@ -75,7 +76,7 @@ class TelegramBotHandler:
                 }
             }
             
-            menu_response = requests.post(
+            menu_response = self.session.post(
                 f"{self.base_url}/setChatMenuButton",
                 json={"menu_button": menu_button},
                 timeout=10
@@ -111,7 +112,7 @@ class TelegramBotHandler:
                 "/status - Get current bot status"
             )
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/sendMessage",
                 json={
                     "chat_id": self.chat_id,
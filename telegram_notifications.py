@@ -1,7 +1,7 @@
-import requests
 import logging
 import os
 from datetime import datetime
+from http_session import create_session
 
 class TelegramNotifier:
     def __init__(self, bot_token, chat_id):
@@ -14,6 +14,7 @@ class TelegramNotifier:
         else:
             self.chat_ids = []
         self.base_url = f"https://api.telegram.org/bot{bot_token}"
+        self.session = create_session()
         
         # Owner ID for access control
         self.owner_id = os.environ.get("TELEGRAM_OWNER_ID", "").strip()
@@ -38,7 +39,7 @@ class TelegramNotifier:
                     "parse_mode": "HTML"
                 }
                 
-                response = requests.post(url, data=data, timeout=10)
+                response = self.session.post(url, data=data, timeout=10)
                 response.raise_for_status()
                 success_count += 1
             except Exception as e:
@@ -100,6 +101,10 @@ class TelegramNotifier:
     
     def send_position_opened(self, position, current_price, trade_number=1, balance=0):
         """Send notification when position is opened"""
+        self.send_message(self.format_position_opened(position, current_price, trade_number, balance))
+    
+    def format_position_opened(self, position, current_price, trade_number=1, balance=0):
+        """Build the position opened message"""
         side_emoji = "📈" if position["side"] == "long" else "📉"
         side_text = "LONG" if position["side"] == "long" else "SHORT"
         
@@ -118,10 +123,14 @@ class TelegramNotifier:
 ⏰ <b>Entry Time:</b> {datetime.fromisoformat(position["entry_time"]).strftime("%H:%M:%S")}
         """.strip()
         
-        self.send_message(message)
+        return message
     
     def send_position_closed(self, trade, trade_number=1, balance=0):
         """Send notification when position is closed"""
+        self.send_message(self.format_position_closed(trade, trade_number, balance))
+    
+    def format_position_closed(self, trade, trade_number=1, balance=0):
+        """Build the position closed message"""
         side_emoji = "📈" if trade["side"] == "long" else "📉"
         side_text = "LONG" if trade["side"] == "long" else "SHORT"
         
@@ -152,7 +161,7 @@ class TelegramNotifier:
 ⏱️ <b>Duration:</b> {trade.get("duration", "N/A")}
         """.strip()
         
-        self.send_message(message)
+        return message
     
     def send_error(self, error_message):
         """Send error notification"""
@@ -299,8 +308,8 @@ Use /help to see available commands.
                 # Fallback to direct import if API fails
                 from trading_bot import state
                 bot_running = False  # Can't get this from trading_bot state
-                balance = state.get('balance', 0)
-                in_position = state.get('in_position', False)
+                balance = state.balance
+                in_position = state.in_position
                 current_price = 0
             
             status_emoji = "🟢" if bot_running else "🔴"
@@ -330,7 +339,7 @@ Use /help to see available commands.
                 "parse_mode": "HTML"
             }
             
-            response = requests.post(url, data=data, timeout=10)
+            response = self.session.post(url, data=data, timeout=10)
             response.raise_for_status()
             return True
         except Exception as e:
@@ -343,7 +352,7 @@ Use /help to see available commands.
             return None
         try:
             url = f"{self.base_url}/getMe"
-            response = requests.get(url, timeout=10)
+            response = self.session.get(url, timeout=10)
             response.raise_for_status()
             bot_info = response.json()
             return bot_info.get('result', {}).get('username')
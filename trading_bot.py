@@ -1,13 +1,16 @@
 import os
 import time
-import json
+import asyncio
+import queue
+import tempfile
 import threading
 import random
-from datetime import datetime, timedelta
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
 
-import ccxt
-import pandas as pd
-from ta.trend import PSARIndicator
+import numpy as np
+import orjson
+from numba import njit
 import logging
 from market_simulator import MarketSimulator
 from signal_sender import SignalSender
@@ -22,32 +25,260 @@ SYMBOL = "ETH/USDT"  # ASCENDEX/MEXC futures symbol format
 LEVERAGE = 500  # плечо x500
 ISOLATED = True  # изолированная маржа
 POSITION_PERCENT = 0.10  # 10% от доступного баланса
+ORDER_NOTIONAL_FACTOR = POSITION_PERCENT * LEVERAGE  # номинал позиции на 1 USDT баланса
 TIMEFRAMES = {"1m": 1, "5m": 5, "30m": 30}  # Установлены 3 таймфрейма: 1м, 5м, 30м
+TF_SECONDS = {tf: minutes * 60 for tf, minutes in TIMEFRAMES.items()}
 MIN_TRADE_SECONDS = 120  # минимальная длительность сделки 2 минуты
 MIN_RANDOM_TRADE_SECONDS = 480  # минимальная случайная длительность сделки 8 минут
 MAX_RANDOM_TRADE_SECONDS = 780  # максимальная случайная длительность сделки 13 минут
 PAUSE_BETWEEN_TRADES = 0  # пауза между сделками убрана
 START_BANK = 100.0  # стартовый банк (для бумажной торговли / учета)
 DASHBOARD_MAX = 20
+# Колонки истории сделок: state.trades хранится по столбцам, новые сделки - в начале каждого списка
+TRADE_FIELDS = ("time_ns", "side", "entry_price", "exit_price", "size_base", "notional", "pnl", "duration", "close_reason")
+STATE_FILE = "goldantilopaeth500_state.json"
+TRADES_LOG = "goldantilopaeth500_trades.log"  # полная история сделок (JSON по строке), в state только последние DASHBOARD_MAX
+STATE_SAVE_EVERY_TICKS = 20  # плановое сохранение состояния раз в N тиков (помимо сделок)
+NOTIFY_QUEUE_SIZE = 256  # очередь Telegram-уведомлений; при переполнении новые отбрасываются
+NOTIFY_BATCH_SECONDS = 0.25  # уведомления, пришедшие за это окно, отправляются одним сообщением
+TELEGRAM_MESSAGE_LIMIT = 4096  # максимальная длина сообщения Telegram
+STATE_FLUSH_DELAY = 0.25  # отложенная запись: сохранения в пределах окна сливаются в одну
+OHLCV_REFRESH_SECONDS = 4.5  # открытая свеча обновляется не чаще одного тика стратегии (с запасом на джиттер sleep)
+WS_RETRY_SECONDS = 5  # пауза перед переподпиской на свечи после ошибки WebSocket
+NETWORK_RETRY_SECONDS = 5  # первая пауза после сетевой ошибки биржи, дальше удваивается
+NETWORK_RETRY_MAX_SECONDS = 60  # потолок паузы при затяжной недоступности биржи
+LOOP_INTERVAL_SECONDS = 5  # тик стратегии внутри бара
+BAR_CLOSE_DELAY = 0.3  # первый тик после закрытия 1m свечи - через столько секунд
+PSAR_STEP = 0.05  # стартовый и шаговый коэффициент ускорения SAR
+PSAR_MAX_STEP = 0.5  # максимальный коэффициент ускорения SAR
+# Колонки массива свечей (порядок ccxt fetch_ohlcv)
+OHLCV_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+OHLCV_TS, OHLCV_OPEN, OHLCV_HIGH, OHLCV_LOW, OHLCV_CLOSE, OHLCV_VOLUME = range(6)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# ccxt загружается вместе с клиентом биржи (_initialize_exchange); до этого классы ошибок -
+# заглушка, которую никто не бросает: в режиме симулятора биржевых ошибок не бывает
+class _ExchangeErrorPlaceholder(Exception):
+    pass
+
+AuthenticationError = BadSymbol = NetworkError = _ExchangeErrorPlaceholder
 
 # ========== Глобальные переменные состояния ==========
-state = {
-    "balance": START_BANK,
-    "available": START_BANK,
-    "in_position": False,
-    "position": None,  # dict: {side, entry_price, size_base, entry_time}
-    "last_trade_time": None,
-    "last_1m_dir": None,
-    "one_min_flip_count": 0,
-    "skip_next_signal": False,  # пропускать следующий сигнал входа
-    "trades": []  # список последних сделок
-}
+def empty_trades():
+    return {column: [] for column in TRADE_FIELDS}
+
+
+@dataclass(slots=True)
+class State:
+    balance: float = START_BANK
+    available: float = START_BANK
+    in_position: bool = False
+    position: dict | None = None  # {side, entry_price, size_base, entry_time, entry_ts, ...}
+    last_trade_time: str | None = None
+    last_1m_dir: str | None = None
+    one_min_flip_count: int = 0
+    skip_next_signal: bool = False  # пропускать следующий сигнал входа
+    trades: dict = field(default_factory=empty_trades)  # последние сделки по столбцам (см. TRADE_FIELDS)
+    telegram_trade_counter: int = 0  # номер последней сделки для уведомлений
+    sar_directions: dict = field(default_factory=lambda: {tf: None for tf in TIMEFRAMES})
+
+    def update(self, data):
+        """Загрузка из JSON файла состояния: неизвестные ключи игнорируются"""
+        for name in self.__slots__:
+            if name in data:
+                setattr(self, name, data[name])
+
+
+state = State()
+# Все составные изменения state (сделки, сброс баланса, загрузка, сериализация) - под этой блокировкой
+state_lock = threading.RLock()
+
+
+def trade_rows(trades):
+    """Сделки по строкам (новые первыми) из столбцового хранения"""
+    return [dict(zip(TRADE_FIELDS, values)) for values in zip(*(trades[column] for column in TRADE_FIELDS))]
+
+
+def pop_trade(trades, index=-1):
+    """Удаляет сделку из всех столбцов и возвращает её как dict"""
+    return {column: trades[column].pop(index) for column in TRADE_FIELDS}
+
+
+def migrate_trades(trades):
+    """Список dict (старый формат файла состояния) -> столбцы; время в ISO переводится в time_ns"""
+    if isinstance(trades, dict):
+        return {column: list(trades.get(column, [])) for column in TRADE_FIELDS}
+    columns = empty_trades()
+    for trade in trades or []:
+        if "time_ns" not in trade:
+            try:
+                moment = datetime.fromisoformat(trade["time"]).replace(tzinfo=timezone.utc)
+                trade = dict(trade, time_ns=(moment - EPOCH) // timedelta(microseconds=1) * 1000)
+            except (KeyError, TypeError, ValueError):
+                trade = dict(trade, time_ns=None)
+        for column in TRADE_FIELDS:
+            columns[column].append(trade.get(column))
+    return columns
+
+
+def format_trade(trade):
+    """Сделка для UI и уведомлений: time_ns превращается в ISO-строку "time" только здесь"""
+    formatted = dict(trade)
+    time_ns = formatted.pop("time_ns", None)
+    if time_ns is not None:
+        formatted["time"] = datetime.fromtimestamp(time_ns / 1e9, timezone.utc).replace(tzinfo=None).isoformat()
+    return formatted
+
+
+def snapshot_state():
+    """Копия state в виде dict для чтения из других потоков (вложенные позиция и сделки копируются)"""
+    with state_lock:
+        return asdict(state)
+
+# ========== Parabolic SAR (Numba) ==========
+@njit(cache=True)
+def _psar_step(prev_sar, up_trend, af, up_trend_high, down_trend_low,
+               high, low, high1, high2, low1, low2, step, afmax):
+    """Один шаг рекурсии Уайлдера (та же логика, что в ta.trend.PSARIndicator)"""
+    reversal = False
+    if up_trend:
+        sar = prev_sar + af * (up_trend_high - prev_sar)
+        if low < sar:
+            reversal = True
+            sar = up_trend_high
+            down_trend_low = low
+            af = step
+        else:
+            if high > up_trend_high:
+                up_trend_high = high
+                af = min(af + step, afmax)
+            if low2 < sar:
+                sar = low2
+            elif low1 < sar:
+                sar = low1
+    else:
+        sar = prev_sar - af * (prev_sar - down_trend_low)
+        if high > sar:
+            reversal = True
+            sar = down_trend_low
+            up_trend_high = high
+            af = step
+        else:
+            if low < down_trend_low:
+                down_trend_low = low
+                af = min(af + step, afmax)
+            if high2 > sar:
+                sar = high2
+            elif high1 > sar:
+                sar = high1
+    return sar, up_trend != reversal, af, up_trend_high, down_trend_low
+
+
+@njit(cache=True)
+def _psar_nb(high, low, close, af0, step, afmax):
+    """Полный ряд PSAR и итоговый тренд (1 = вверх, -1 = вниз)"""
+    psar = close.copy()
+    up_trend = True
+    af = af0
+    up_trend_high = high[0]
+    down_trend_low = low[0]
+    for i in range(2, close.shape[0]):
+        psar[i], up_trend, af, up_trend_high, down_trend_low = _psar_step(
+            psar[i - 1], up_trend, af, up_trend_high, down_trend_low,
+            high[i], low[i], high[i - 1], high[i - 2], low[i - 1], low[i - 2],
+            step, afmax)
+    return psar, np.int8(1 if up_trend else -1)
+
+
+@njit(cache=True)
+def _last_direction_nb(high, low, close, af0, step, afmax):
+    """Направление по последней свече (1 = long, -1 = short, 0 = нет данных) без выделения массива"""
+    n = close.shape[0]
+    if n == 0:
+        return np.int8(0)
+    sar = close[min(n, 2) - 1]
+    up_trend = True
+    af = af0
+    up_trend_high = high[0]
+    down_trend_low = low[0]
+    for i in range(2, n):
+        sar, up_trend, af, up_trend_high, down_trend_low = _psar_step(
+            sar, up_trend, af, up_trend_high, down_trend_low,
+            high[i], low[i], high[i - 1], high[i - 2], low[i - 1], low[i - 2],
+            step, afmax)
+    if np.isnan(sar):
+        return np.int8(0)
+    return np.int8(1 if close[n - 1] > sar else -1)
+
+
+@njit(cache=True)
+def _psar_advance_nb(high, low, start, stop, st, step, afmax):
+    """Продвигает сохранённое состояние st = [sar, up_trend, af, up_trend_high, down_trend_low] по свечам [start, stop)"""
+    sar = st[0]
+    up_trend = st[1] > 0
+    af = st[2]
+    up_trend_high = st[3]
+    down_trend_low = st[4]
+    for i in range(start, stop):
+        sar, up_trend, af, up_trend_high, down_trend_low = _psar_step(
+            sar, up_trend, af, up_trend_high, down_trend_low,
+            high[i], low[i], high[i - 1], high[i - 2], low[i - 1], low[i - 2],
+            step, afmax)
+    st[0] = sar
+    st[1] = 1.0 if up_trend else 0.0
+    st[2] = af
+    st[3] = up_trend_high
+    st[4] = down_trend_low
+
+
+@njit(cache=True)
+def _psar_peek_nb(high, low, start, stop, st, step, afmax):
+    """SAR свечи stop - 1 после шагов по [start, stop) от состояния st, само st не меняется"""
+    sar = st[0]
+    up_trend = st[1] > 0
+    af = st[2]
+    up_trend_high = st[3]
+    down_trend_low = st[4]
+    for i in range(start, stop):
+        sar, up_trend, af, up_trend_high, down_trend_low = _psar_step(
+            sar, up_trend, af, up_trend_high, down_trend_low,
+            high[i], low[i], high[i - 1], high[i - 2], low[i - 1], low[i - 2],
+            step, afmax)
+    return sar
+
+
+# ========== Уведомление подписчиков об изменении состояния ==========
+# Версия растёт при каждом тике стратегии и сделке; WebSocket дашборда ждёт её изменения
+state_changed = threading.Condition()
+state_version = 0
+
+def notify_state_changed():
+    global state_version
+    with state_changed:
+        state_version += 1
+        state_changed.notify_all()
+
+def wait_state_changed(last_version, timeout=None):
+    """Ждёт, пока версия состояния отличается от last_version; возвращает текущую версию"""
+    with state_changed:
+        state_changed.wait_for(lambda: state_version != last_version, timeout)
+        return state_version
+
 
 class TradingBot:
     def __init__(self, telegram_notifier=None):
         self.notifier = telegram_notifier
         self.signal_sender = SignalSender()
         
+        # Уведомления и сигналы отправляются фоновым потоком, чтобы HTTP не тормозил стратегию
+        self._notif_q = queue.Queue(maxsize=NOTIFY_QUEUE_SIZE)
+        threading.Thread(target=self._notif_worker, daemon=True).start()
+        
+        # Собственный event loop бота: асинхронный клиент биржи привязан к нему на всё время жизни
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        
         if USE_SIMULATOR:
             logging.info("Initializing market simulator")
             self.simulator = MarketSimulator(initial_price=3000, volatility=0.02)
@@ -55,264 +286,686 @@ class TradingBot:
         else:
             logging.info("Initializing ASCENDEX exchange connection")
             self.simulator = None
-            self.exchange = ccxt.ascendex({
-                "apiKey": API_KEY,
-                "secret": API_SECRET,
-                "enableRateLimit": True,
-                "options": {
-                    "defaultType": "swap",
-                }
-            })
+            self.exchange = self._initialize_exchange()
             
             if API_KEY and API_SECRET:
-                try:
-                    if ISOLATED:
-                        self.exchange.set_margin_mode('isolated', SYMBOL)
-                    self.exchange.set_leverage(LEVERAGE, SYMBOL)
-                except Exception as e:
-                    logging.error(f"Failed to configure exchange: {e}")
+                self.run_sync(self._configure_exchange())
+        
+        # Кэш свечей: (таймфрейм, номер бара) -> (массив свечей, время обновления)
+        self._ohlcv_cache = {}
+        # Кольцевые буферы свечей: таймфрейм -> (буфер, начало, конец); в кэше лежат view на них
+        self._ohlcv_buf = {}
+        # Блокировка на таймфрейм: параллельные вызовы ждут один запрос вместо дублирующих
+        self._ohlcv_locks = {}
+        # Задачи WebSocket-подписок на свечи (только для реальной биржи)
+        self._ws_tasks = {}
+        # Потоковое состояние SAR по таймфреймам: (timestamp последней учтённой закрытой свечи, массив состояния)
+        self._psar_state = {}
+        # Хэш последнего записанного состояния: неизменное состояние не перезаписывается
+        self._state_hash = None
+        # Сохранение вызывается и из потока бота, и из Flask - записи выполняются по очереди
+        self._save_lock = threading.Lock()
+        # Отложенная запись состояния (schedule_save): один взведённый таймер на все события окна
+        self._flush_timer = None
+        self._flush_lock = threading.Lock()
+        # Сделки открываются и закрываются строго по одной в event loop бота
+        self._trade_lock = asyncio.Lock()
         
         self.load_state_from_file()
+        self._warmup_psar()
         
+    def _warmup_psar(self):
+        """Компиляция (или загрузка из кэша numba) PSAR-ядер до первого тика стратегии"""
+        # Те же типы, что в работе: столбцы-срезы массива свечей (n, 6), а не отдельные массивы
+        ohlcv = np.empty((200, len(OHLCV_COLUMNS)), dtype=np.float64)
+        ohlcv[:, OHLCV_CLOSE] = np.linspace(3000.0, 3100.0, 200)
+        ohlcv[:, OHLCV_HIGH] = ohlcv[:, OHLCV_CLOSE] + 1.0
+        ohlcv[:, OHLCV_LOW] = ohlcv[:, OHLCV_CLOSE] - 1.0
+        self.last_psar_direction(ohlcv)
+        self.compute_psar_series(ohlcv)
+        ohlcv[:, OHLCV_TS] = np.arange(200) * 60000.0
+        self._stream_psar_direction("warmup", ohlcv)
+        del self._psar_state["warmup"]
+
+    def _initialize_exchange(self):
+        global AuthenticationError, BadSymbol, NetworkError
+        # ccxt импортирует классы всех бирж - грузим его только когда нужна реальная биржа
+        import ccxt.pro as ccxt_pro
+        from ccxt.base.errors import AuthenticationError, BadSymbol, NetworkError
+        # ccxt.pro-клиент: те же REST-методы плюс WebSocket-подписки (watch_ohlcv)
+        return ccxt_pro.ascendex({
+            "apiKey": API_KEY,
+            "secret": API_SECRET,
+            "enableRateLimit": True,
+            "options": {
+                "defaultType": "swap",
+            },
+            "asyncio_loop": self.loop,
+        })
+
+    async def _configure_exchange(self):
+        try:
+            if ISOLATED:
+                await self.exchange.set_margin_mode('isolated', SYMBOL)
+            await self.exchange.set_leverage(LEVERAGE, SYMBOL)
+        except Exception as e:
+            logging.error(f"Failed to configure exchange: {e}")
+
+    def _notif_worker(self):
+        while True:
+            messages = []
+            self._handle_notification(self._notif_q.get(), messages)
+            # Всё, что пришло за NOTIFY_BATCH_SECONDS, уходит в Telegram одним сообщением.
+            # Сигналы ставок не копятся и отправляются сразу по получении
+            deadline = time.monotonic() + NOTIFY_BATCH_SECONDS
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._notif_q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                self._handle_notification(item, messages)
+            if messages:
+                try:
+                    for digest in self._join_messages(messages):
+                        self.notifier.send_message(digest)
+                except Exception as e:
+                    logging.error(f"Notification error: {e}")
+
+    def _handle_notification(self, item, messages):
+        kind, args = item
+        try:
+            if kind == "entry":
+                messages.append(self.notifier.format_position_opened(*args))
+            elif kind == "exit":
+                messages.append(self.notifier.format_position_closed(*args))
+            elif kind == "open_long":
+                self.signal_sender.send_open_long()
+            elif kind == "open_short":
+                self.signal_sender.send_open_short()
+            elif kind == "error":
+                self.notifier.send_error(*args)
+        except Exception as e:
+            logging.error(f"Notification error ({kind}): {e}")
+
+    @staticmethod
+    def _join_messages(messages):
+        """Склеивает сообщения в дайджесты, не превышая лимит длины сообщения Telegram"""
+        digests = [messages[0]]
+        for message in messages[1:]:
+            if len(digests[-1]) + len(message) + 2 > TELEGRAM_MESSAGE_LIMIT:
+                digests.append(message)
+            else:
+                digests[-1] += "\n\n" + message
+        return digests
+
+    def notify(self, kind, *args):
+        if kind in ("entry", "exit", "error") and not self.notifier:
+            return
+        try:
+            self._notif_q.put_nowait((kind, args))
+        except queue.Full:
+            logging.warning(f"Notification queue full, dropping {kind} notification")
+
+    def run_sync(self, coro, timeout=30):
+        """Выполняет корутину в event loop бота и ждёт результат (для Flask и потока бота)"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def schedule_save(self):
+        """Сохраняет состояние через STATE_FLUSH_DELAY в потоке таймера, объединяя частые вызовы"""
+        with self._flush_lock:
+            if self._flush_timer is not None:
+                return
+            self._flush_timer = threading.Timer(STATE_FLUSH_DELAY, self._flush_state)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_state(self):
+        # Таймер снимается до записи: изменения во время сохранения взведут новый
+        with self._flush_lock:
+            self._flush_timer = None
+        self.save_state_to_file()
+
     def save_state_to_file(self):
         try:
-            with open("goldantilopaeth500_state.json", "w") as f:
-                json.dump(state, f, default=str, indent=2)
+            with self._save_lock:
+                with state_lock:
+                    data = orjson.dumps(state, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+                state_hash = hash(data)
+                if state_hash == self._state_hash:
+                    return
+                # Пишем во временный файл, сбрасываем на диск и атомарно подменяем,
+                # чтобы сбой (в том числе питания) не оставил обрезанный JSON
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(STATE_FILE)), prefix=STATE_FILE + ".", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.replace(tmp_path, STATE_FILE)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+                self._state_hash = state_hash
         except Exception as e:
             logging.error(f"Save error: {e}")
 
     def load_state_from_file(self):
         try:
-            with open("goldantilopaeth500_state.json", "r") as f:
-                data = json.load(f)
-                state.update(data)
-        except:
-            pass
+            with open(STATE_FILE, "rb") as f:
+                data = orjson.loads(f.read())
+        except FileNotFoundError:
+            return
+        except (OSError, orjson.JSONDecodeError) as e:
+            logging.error(f"State load error, starting from defaults: {e}")
+            return
+        if not isinstance(data, dict):
+            logging.error("State load error, starting from defaults: state file is not a JSON object")
+            return
+        with state_lock:
+            state.update(data)
+            state.trades = migrate_trades(state.trades)
 
     def now(self):
         return datetime.utcnow()
 
-    def fetch_ohlcv_tf(self, tf: str, limit=200):
+    async def fetch_ohlcv_tf(self, tf: str, limit=200, copy=False):
+        """copy=True - для других потоков (Flask): без копии это view на буфер, который бот дописывает на месте"""
+        lock = self._ohlcv_locks.setdefault(tf, asyncio.Lock())
+        async with lock:
+            ohlcv = await self._fetch_ohlcv_cached(tf, limit)
+        return ohlcv.copy() if copy and ohlcv is not None else ohlcv
+
+    async def _fetch_ohlcv_cached(self, tf: str, limit):
+        now = time.time()
+        key = (tf, int(now // TF_SECONDS.get(tf, 60)))
+        cached = self._ohlcv_cache.get(key)
+        if cached is not None and len(cached[0]) >= limit:
+            ohlcv, updated_at = cached
+            # Пока WebSocket присылает свечи, updated_at свежий и REST не нужен
+            if now - updated_at >= OHLCV_REFRESH_SECONDS:
+                # Внутри бара меняется только открытая свеча - дозапрашиваем две последние
+                last = await self._fetch_ohlcv_array(tf, limit=2, min_rows=1)
+                if last is not None:
+                    ohlcv = self._merge_candles(tf, last)
+                    self._ohlcv_cache[key] = (ohlcv, now)
+            return ohlcv[-limit:]
+
+        ohlcv = await self._fetch_ohlcv_array(tf, limit=limit)
+        if ohlcv is not None:
+            for old_key in [k for k in self._ohlcv_cache if k[0] == tf and k != key]:
+                del self._ohlcv_cache[old_key]
+            ohlcv = self._load_candles(tf, ohlcv)
+            self._ohlcv_cache[key] = (ohlcv, now)
+        return ohlcv
+
+    def _load_candles(self, tf, ohlcv):
+        """Полная история -> новый буфер с запасом на столько же дозаписей"""
+        buf = np.empty((2 * len(ohlcv), len(OHLCV_COLUMNS)), dtype=np.float64)
+        buf[:len(ohlcv)] = ohlcv
+        self._ohlcv_buf[tf] = (buf, 0, len(ohlcv))
+        return buf[:len(ohlcv)]
+
+    def _merge_candles(self, tf, rows):
+        """Заменяет свечи начиная с первой из rows прямо в буфере и сохраняет длину истории"""
+        buf, start, stop = self._ohlcv_buf[tf]
+        n = stop - start
+        rows = rows[-n:]
+        keep = int(np.searchsorted(buf[start:stop, OHLCV_TS], rows[0, OHLCV_TS]))
+        hist = slice(start + max(keep + len(rows) - n, 0), start + keep)
+        if hist.stop + len(rows) > len(buf):
+            # Буфер кончился: история переезжает в новый, старый остаётся у уже выданных view
+            new_buf = np.empty_like(buf)
+            new_buf[:hist.stop - hist.start] = buf[hist]
+            buf, hist = new_buf, slice(0, hist.stop - hist.start)
+        stop = hist.stop + len(rows)
+        buf[hist.stop:stop] = rows
+        self._ohlcv_buf[tf] = (buf, hist.start, stop)
+        return buf[hist.start:stop]
+
+    def _apply_live_candles(self, tf, rows):
+        """Свечи из WebSocket -> кэш; новая свеча переносит запись в ключ нового бара без REST-запроса"""
+        entry = next(((k, v) for k, v in self._ohlcv_cache.items() if k[0] == tf), None)
+        if entry is None:
+            return  # истории ещё нет - её загрузит первый fetch_ohlcv_tf
+        old_key = entry[0]
+        buf, _, stop = self._ohlcv_buf[tf]
+        if rows[0, OHLCV_TS] > buf[stop - 1, OHLCV_TS] + TF_SECONDS.get(tf, 60) * 1000:
+            # Между историей и потоком пропущены бары (переподключение, неудачная перезагрузка):
+            # склеивать нельзя - следующий fetch_ohlcv_tf загрузит историю целиком через REST
+            del self._ohlcv_cache[old_key]
+            del self._ohlcv_buf[tf]
+            return
+        ohlcv = self._merge_candles(tf, rows)
+        key = (tf, int(ohlcv[-1, OHLCV_TS] / 1000 // TF_SECONDS.get(tf, 60)))
+        if key != old_key:
+            del self._ohlcv_cache[old_key]
+        self._ohlcv_cache[key] = (ohlcv, time.time())
+
+    async def _watch_ohlcv(self, tf):
+        while True:
+            try:
+                candles = await self.exchange.watch_ohlcv(SYMBOL, tf)
+                if candles:
+                    self._apply_live_candles(tf, np.asarray(candles, dtype=np.float64))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Кэш продолжает обновляться через REST, подписка восстанавливается после паузы
+                logging.warning(f"OHLCV stream {tf} error: {e}")
+                await asyncio.sleep(WS_RETRY_SECONDS)
+
+    def start_ohlcv_streams(self):
+        """Подписки на свечи всех таймфреймов; вызывается в event loop бота"""
+        if self.exchange is None:
+            return
+        for tf in TIMEFRAMES:
+            task = self._ws_tasks.get(tf)
+            if task is None or task.done():
+                self._ws_tasks[tf] = asyncio.create_task(self._watch_ohlcv(tf))
+
+    async def stop_ohlcv_streams(self):
+        tasks = list(self._ws_tasks.values())
+        self._ws_tasks.clear()
+        if not tasks:
+            return
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            # Закрывает WebSocket-соединения подписок; REST-сессия откроется заново при следующем запросе
+            await self.exchange.close()
+        except Exception as e:
+            logging.warning(f"Error closing exchange streams: {e}")
+
+    def get_cached_price(self):
+        """Последняя цена закрытия из кэша 1m свечей, без запроса к бирже"""
+        for (tf, _), (ohlcv, _) in list(self._ohlcv_cache.items()):
+            if tf == "1m":
+                return float(ohlcv[-1, OHLCV_CLOSE])
+        return None
+
+    async def _fetch_ohlcv_array(self, tf: str, limit=200, min_rows=5):
+        """Свечи как float64 массив (n, 6): timestamp, open, high, low, close, volume"""
         try:
             if USE_SIMULATOR and self.simulator:
                 ohlcv = self.simulator.fetch_ohlcv(tf, limit=limit)
             else:
                 try:
-                    ohlcv = self.exchange.fetch_ohlcv("ETH/USDT", timeframe=tf, limit=limit)
-                except:
-                    ohlcv = self.exchange.fetch_ohlcv(SYMBOL, timeframe=tf, limit=limit)
+                    ohlcv = await self.exchange.fetch_ohlcv("ETH/USDT", timeframe=tf, limit=limit)
+                except BadSymbol:
+                    ohlcv = await self.exchange.fetch_ohlcv(SYMBOL, timeframe=tf, limit=limit)
             
-            if not ohlcv or len(ohlcv) < 5:
+            if not ohlcv or len(ohlcv) < min_rows:
                 return None
                 
-            df = pd.DataFrame(ohlcv)
-            df.columns = ["timestamp", "open", "high", "low", "close", "volume"]
-            df["datetime"] = pd.to_datetime(df["timestamp"], unit="ms")
-            return df
+            return np.asarray(ohlcv, dtype=np.float64)
+        except (AuthenticationError, NetworkError):
+            # Недоступность биржи и отказ в доступе обрабатывает цикл стратегии
+            raise
         except Exception as e:
             logging.error(f"Error fetching {tf} ohlcv: {e}")
             return None
 
-    def compute_psar(self, df: pd.DataFrame):
-        if df is None or len(df) < 5:
+    def compute_psar_series(self, ohlcv: np.ndarray):
+        """Полный ряд SAR - нужен только для /api/debug_sar"""
+        if ohlcv is None or len(ohlcv) < 5:
             return None
         try:
-            psar_ind = PSARIndicator(high=df["high"].astype(float), low=df["low"].astype(float), close=df["close"].astype(float), step=0.05, max_step=0.5)
-            return psar_ind.psar()
+            psar, _ = _psar_nb(
+                ohlcv[:, OHLCV_HIGH], ohlcv[:, OHLCV_LOW], ohlcv[:, OHLCV_CLOSE],
+                PSAR_STEP, PSAR_STEP, PSAR_MAX_STEP,
+            )
+            return psar
         except Exception as e:
             logging.error(f"PSAR compute error: {e}")
             return None
 
-    def get_direction_from_psar(self, df: pd.DataFrame):
-        psar = self.compute_psar(df)
-        if psar is None or len(psar) == 0:
+    def last_psar_direction(self, ohlcv: np.ndarray, tf=None):
+        """Направление по последней свече; с tf - потоково по сохранённому состоянию SAR"""
+        if ohlcv is None or len(ohlcv) < 5:
             return None
-        last_psar = psar.iloc[-1]
-        last_close = float(df["close"].iloc[-1])
-        if pd.isna(last_psar):
+        try:
+            if tf is None:
+                direction = _last_direction_nb(
+                    ohlcv[:, OHLCV_HIGH], ohlcv[:, OHLCV_LOW], ohlcv[:, OHLCV_CLOSE],
+                    PSAR_STEP, PSAR_STEP, PSAR_MAX_STEP,
+                )
+            else:
+                direction = self._stream_psar_direction(tf, ohlcv)
+        except Exception as e:
+            logging.error(f"PSAR compute error: {e}")
+            return None
+        if direction == 0:
             return None
-        return "long" if last_close > last_psar else "short"
+        return "long" if direction > 0 else "short"
+
+    def _stream_psar_direction(self, tf, ohlcv):
+        """Рекурсия SAR сохраняется по свечу n-3 включительно; последние две считаются заново на каждом тике,
+        потому что обновление кэша (REST по двум свечам, WebSocket) ещё может переписать свечу n-2"""
+        ts = ohlcv[:, OHLCV_TS]
+        high = ohlcv[:, OHLCV_HIGH]
+        low = ohlcv[:, OHLCV_LOW]
+        close = ohlcv[:, OHLCV_CLOSE]
+        n = len(ohlcv)
+        start = None
+        saved = self._psar_state.get(tf)
+        if saved is not None:
+            last_ts, st = saved
+            # Обычно это третья с конца свеча (тот же бар) или четвёртая (начался новый бар)
+            if ts[n - 3] == last_ts:
+                start = n - 2
+            else:
+                pos = int(np.searchsorted(ts, last_ts))
+                # Последняя учтённая свеча должна быть в окне до двух пересчитываемых (и иметь предшественницу)
+                if 1 <= pos <= n - 3 and ts[pos] == last_ts:
+                    start = pos + 1
+        if start is None:
+            # Первый вызов или разрыв истории: начинаем с начала окна, как пакетное ядро
+            st = np.array([close[1], 1.0, PSAR_STEP, high[0], low[0]])
+            start = 2
+        if start < n - 2:
+            _psar_advance_nb(high, low, start, n - 2, st, PSAR_STEP, PSAR_MAX_STEP)
+            self._psar_state[tf] = (ts[n - 3], st)
+        sar = _psar_peek_nb(high, low, n - 2, n, st, PSAR_STEP, PSAR_MAX_STEP)
+        if sar != sar:  # NaN
+            return 0
+        return 1 if close[n - 1] > sar else -1
+
+    def cached_directions(self, timeframes):
+        """Направления по уже закэшированным свечам, без запросов к бирже (None не возвращаются)"""
+        directions = {}
+        for (tf, _), (ohlcv, _) in list(self._ohlcv_cache.items()):
+            if tf in timeframes:
+                direction = self.last_psar_direction(ohlcv, tf)
+                if direction is not None:
+                    directions[tf] = direction
+        return directions
+
+    async def background_directions(self, timeframes):
+        """Направления таймфреймов, не участвующих в решении: из кэша, REST - только если кэш сам не обновится"""
+        # Без WebSocket (симулятор, запрос локальный) и до первой загрузки истории (рестарт в позиции)
+        refetch = timeframes if self.exchange is None else tuple(tf for tf in timeframes if tf not in self._ohlcv_buf)
+        directions = self.cached_directions([tf for tf in timeframes if tf not in refetch])
+        if refetch:
+            directions.update(await self.get_current_directions(refetch))
+        return directions
 
-    def get_current_directions(self):
+    async def get_current_directions(self, timeframes=TIMEFRAMES):
+        candles = await asyncio.gather(*[self.fetch_ohlcv_tf(tf) for tf in timeframes])
         directions = {}
-        for tf in TIMEFRAMES.keys():
-            df = self.fetch_ohlcv_tf(tf)
-            directions[tf] = self.get_direction_from_psar(df) if df is not None else None
+        for tf, ohlcv in zip(timeframes, candles):
+            directions[tf] = self.last_psar_direction(ohlcv, tf) if ohlcv is not None else None
         return directions
 
     def compute_order_size_usdt(self, balance, price):
-        notional = balance * POSITION_PERCENT * LEVERAGE
-        base_amount = notional / price
-        return base_amount, notional
-
-    def place_market_order(self, side: str, amount_base: float):
-        if RUN_IN_PAPER or not API_KEY:
-            price = self.get_current_price()
-            entry_time = self.now()
-            notional = amount_base * price
-            margin = notional / LEVERAGE
-            state["available"] -= margin
-            
-            if "telegram_trade_counter" not in state:
-                state["telegram_trade_counter"] = 1
-            else:
-                state["telegram_trade_counter"] += 1
-            
-            state["in_position"] = True
-            state["position"] = {
-                "side": "long" if side == "buy" else "short",
-                "entry_price": price,
-                "size_base": amount_base,
-                "notional": notional,
-                "margin": margin,
-                "entry_time": entry_time.isoformat(),
-                "trade_number": state["telegram_trade_counter"]
-            }
-            
-            if self.notifier:
-                self.notifier.send_position_opened(state["position"], price, state["position"]["trade_number"], state["balance"])
-            
-            if side == "buy": self.signal_sender.send_open_long()
-            else: self.signal_sender.send_open_short()
-            
-            return state["position"]
-        else:
-            try:
-                order = self.exchange.create_market_buy_order(SYMBOL, amount_base) if side == "buy" else self.exchange.create_market_sell_order(SYMBOL, amount_base)
-                price = self.get_price_from_order(order)
+        if balance <= 0 or price <= 0:
+            return 0.0, 0.0
+        notional = balance * ORDER_NOTIONAL_FACTOR
+        return notional / price, notional
+
+    async def place_market_order(self, side: str, amount_base: float):
+        # Открытие и закрытие идут по очереди: ручное закрытие из Flask не пересечётся с ботом
+        async with self._trade_lock:
+            if state.in_position:
+                return None
+            if RUN_IN_PAPER or not API_KEY:
+                price = await self.get_current_price()
                 entry_time = self.now()
                 notional = amount_base * price
                 margin = notional / LEVERAGE
-                state["available"] -= margin
-                state["in_position"] = True
-                state["position"] = {
-                    "side": "long" if side == "buy" else "short",
-                    "entry_price": price,
-                    "size_base": amount_base,
-                    "notional": notional,
-                    "margin": margin,
-                    "entry_time": entry_time.isoformat()
-                }
-                if side == "buy": self.signal_sender.send_open_long()
-                else: self.signal_sender.send_open_short()
-                return state["position"]
-            except Exception as e:
-                logging.error(f"Order error: {e}")
-                return None
+                with state_lock:
+                    state.available -= margin
+                    
+                    state.telegram_trade_counter += 1
+                    
+                    state.in_position = True
+                    state.position = {
+                        "side": "long" if side == "buy" else "short",
+                        "entry_price": price,
+                        "size_base": amount_base,
+                        "notional": notional,
+                        "margin": margin,
+                        "entry_time": entry_time.isoformat(),
+                        "entry_ts": time.time(),
+                        "trade_number": state.telegram_trade_counter
+                    }
+                    position = dict(state.position)
+                    balance = state.balance
+                
+                self.notify("entry", position, price, position["trade_number"], balance)
+                notify_state_changed()
+                
+                self.notify("open_long" if side == "buy" else "open_short")
+                
+                return position
+            else:
+                try:
+                    order = await self.exchange.create_market_buy_order(SYMBOL, amount_base) if side == "buy" else await self.exchange.create_market_sell_order(SYMBOL, amount_base)
+                    price = await self.get_price_from_order(order)
+                    entry_time = self.now()
+                    notional = amount_base * price
+                    margin = notional / LEVERAGE
+                    with state_lock:
+                        state.available -= margin
+                        state.in_position = True
+                        state.position = {
+                            "side": "long" if side == "buy" else "short",
+                            "entry_price": price,
+                            "size_base": amount_base,
+                            "notional": notional,
+                            "margin": margin,
+                            "entry_time": entry_time.isoformat(),
+                            "entry_ts": time.time()
+                        }
+                        position = dict(state.position)
+                    notify_state_changed()
+                    self.notify("open_long" if side == "buy" else "open_short")
+                    return position
+                except Exception as e:
+                    logging.error(f"Order error: {e}")
+                    return None
 
-    def get_price_from_order(self, order):
-        if not order: return self.get_current_price()
-        for field in ['average', 'price']:
-            if order.get(field): return float(order[field])
+    async def get_price_from_order(self, order):
+        if not order: return await self.fetch_last_price()
+        for key in ['average', 'price']:
+            if order.get(key): return float(order[key])
         info = order.get('info', {})
-        for field in ['avgPrice', 'price']:
-            if info.get(field): return float(info[field])
-        return self.get_current_price()
-
-    def close_position(self, close_reason="unknown"):
-        if not state["in_position"]: return None
-        side = state["position"]["side"]
-        size = state["position"]["size_base"]
-        
-        if RUN_IN_PAPER or not API_KEY:
-            price = self.get_current_price()
-            entry_price = state["position"]["entry_price"]
-            pnl = (price - entry_price) * size if side == "long" else (entry_price - price) * size
-            pnl -= abs(state["position"]["notional"]) * 0.0003
-            
-            state["available"] += state["position"]["margin"] + pnl
-            state["balance"] = state["available"]
-            
-            trade = {
-                "time": self.now().isoformat(),
-                "side": side,
-                "entry_price": entry_price,
-                "exit_price": price,
-                "size_base": size,
-                "pnl": pnl,
-                "duration": self.calculate_duration(state["position"]["entry_time"]),
-                "close_reason": close_reason
-            }
-            
-            if self.notifier:
-                self.notifier.send_position_closed(trade, state["position"].get("trade_number", 1), state["balance"])
+        for key in ['avgPrice', 'price']:
+            if info.get(key): return float(info[key])
+        return await self.fetch_last_price()
+
+    async def close_position(self, close_reason="unknown"):
+        async with self._trade_lock:
+            # Позицию могли закрыть, пока ждали блокировку
+            if not state.in_position: return None
+            side = state.position["side"]
+            size = state.position["size_base"]
             
-            self.append_trade(trade)
-            state["in_position"] = False
-            state["position"] = None
-            self.save_state_to_file()
-            return trade
+            if RUN_IN_PAPER or not API_KEY:
+                price = await self.fetch_last_price()
+                with state_lock:
+                    position = state.position
+                    if position is None:  # баланс сбросили во время запроса цены
+                        return None
+                    entry_price = position["entry_price"]
+                    pnl = (price - entry_price) * size if side == "long" else (entry_price - price) * size
+                    pnl -= abs(position["notional"]) * 0.0003
+                    
+                    state.available += position["margin"] + pnl
+                    state.balance = state.available
+                    
+                    trade = {
+                        "time_ns": time.time_ns(),
+                        "side": side,
+                        "entry_price": entry_price,
+                        "exit_price": price,
+                        "size_base": size,
+                        "notional": position["notional"],
+                        "pnl": pnl,
+                        "duration": self.calculate_duration(position),
+                        "close_reason": close_reason
+                    }
+                    
+                    self.append_trade(trade)
+                    state.in_position = False
+                    state.position = None
+                    balance = state.balance
+                
+                self.notify("exit", format_trade(trade), position.get("trade_number", 1), balance)
+                self.schedule_save()
+                notify_state_changed()
+                return trade
+            else:
+                try:
+                    order = await self.exchange.create_market_sell_order(SYMBOL, size) if side == "long" else await self.exchange.create_market_buy_order(SYMBOL, size)
+                    exit_price = await self.get_price_from_order(order)
+                    with state_lock:
+                        position = state.position
+                        if position is None:
+                            return None
+                        entry_price = position["entry_price"]
+                        pnl = (exit_price - entry_price) * size if side == "long" else (entry_price - exit_price) * size
+                        pnl -= abs(position["notional"]) * 0.0003
+                        state.available += position["margin"] + pnl
+                        state.balance = state.available
+                        trade = {
+                            "time_ns": time.time_ns(),
+                            "side": side,
+                            "entry_price": entry_price,
+                            "exit_price": exit_price,
+                            "pnl": pnl,
+                            "duration": self.calculate_duration(position),
+                            "close_reason": close_reason
+                        }
+                        self.append_trade(trade)
+                        state.in_position = False
+                        state.position = None
+                    self.schedule_save()
+                    notify_state_changed()
+                    return trade
+                except Exception as e:
+                    logging.error(f"Close error: {e}")
+                    return None
+
+    def calculate_duration(self, position):
+        # entry_ts - секунды эпохи; ISO-строку разбираем только у позиций, открытых до его появления
+        entry_ts = position.get("entry_ts")
+        if entry_ts is not None:
+            seconds = time.time() - entry_ts
         else:
             try:
-                order = self.exchange.create_market_sell_order(SYMBOL, size) if side == "long" else self.exchange.create_market_buy_order(SYMBOL, size)
-                exit_price = self.get_price_from_order(order)
-                entry_price = state["position"]["entry_price"]
-                pnl = (exit_price - entry_price) * size if side == "long" else (entry_price - exit_price) * size
-                pnl -= abs(state["position"]["notional"]) * 0.0003
-                state["available"] += state["position"]["margin"] + pnl
-                state["balance"] = state["available"]
-                trade = {
-                    "time": self.now().isoformat(),
-                    "side": side,
-                    "entry_price": entry_price,
-                    "exit_price": exit_price,
-                    "pnl": pnl,
-                    "duration": self.calculate_duration(state["position"]["entry_time"]),
-                    "close_reason": close_reason
-                }
-                self.append_trade(trade)
-                state["in_position"] = False
-                state["position"] = None
-                self.save_state_to_file()
-                return trade
-            except Exception as e:
-                logging.error(f"Close error: {e}")
-                return None
+                seconds = (self.now() - datetime.fromisoformat(position["entry_time"].replace('Z', '+00:00'))).total_seconds()
+            except: return "N/A"
+        m, s = divmod(int(seconds), 60)
+        return f"{m}м {s}с" if m > 0 else f"{s}с"
 
-    def calculate_duration(self, entry_time_str):
+    def append_trade(self, trade):
+        for column, values in state.trades.items():
+            values.insert(0, trade.get(column))
+            del values[DASHBOARD_MAX:]
         try:
-            duration = self.now() - datetime.fromisoformat(entry_time_str.replace('Z', '+00:00'))
-            m, s = divmod(int(duration.total_seconds()), 60)
-            return f"{m}м {s}с" if m > 0 else f"{s}с"
-        except: return "N/A"
+            with open(TRADES_LOG, "ab") as f:
+                f.write(orjson.dumps(trade, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE))
+        except OSError as e:
+            logging.error(f"Trade log error: {e}")
 
-    def append_trade(self, trade):
-        state["trades"].insert(0, trade)
-        state["trades"] = state["trades"][:DASHBOARD_MAX]
+    async def get_current_price(self):
+        """Цена для решений стратегии: последняя 1m свеча из кэша, тикер - только если кэш пуст"""
+        price = self.get_cached_price()
+        if price is not None:
+            return price
+        return await self.fetch_last_price()
 
-    def get_current_price(self):
+    async def fetch_last_price(self):
+        """Свежая цена последней сделки с биржи (для расчёта PnL при закрытии)"""
         try:
             if USE_SIMULATOR: return self.simulator.get_current_price()
-            try: ticker = self.exchange.fetch_ticker("ETH/USDT")
-            except: ticker = self.exchange.fetch_ticker(SYMBOL)
+            try: ticker = await self.exchange.fetch_ticker("ETH/USDT")
+            except BadSymbol: ticker = await self.exchange.fetch_ticker(SYMBOL)
             return float(ticker["last"])
-        except: return 3000.0
+        except (AuthenticationError, NetworkError):
+            # Без настоящей цены сделку не закрываем: ошибку обрабатывает цикл стратегии или маршрут Flask
+            raise
+        except Exception as e:
+            logging.error(f"Error fetching last price: {e}")
+            return 3000.0
+
+    def seconds_to_next_tick(self):
+        """Обычный тик - через LOOP_INTERVAL_SECONDS, но не позже чем сразу после закрытия 1m свечи"""
+        now = time.time()
+        bar = TF_SECONDS["1m"]
+        next_close = (now // bar + 1) * bar
+        return max(0.5, min(LOOP_INTERVAL_SECONDS, next_close - now + BAR_CLOSE_DELAY))
 
-    def strategy_loop(self, should_continue=lambda: True):
+    async def strategy_loop(self, should_continue=lambda: True):
+        self.start_ohlcv_streams()
+        try:
+            await self._run_strategy(should_continue)
+        finally:
+            await self.stop_ohlcv_streams()
+
+    async def _run_strategy(self, should_continue):
+        ticks = 0
+        retry_delay = NETWORK_RETRY_SECONDS
         while should_continue():
             try:
-                dirs = self.get_current_directions()
+                # В позиции и при skip_next_signal решение зависит только от 1m: старшие таймфреймы
+                # считаются для дашборда по свечам из кэша (в живом режиме его обновляет WebSocket)
+                need_all = not state.in_position and not state.skip_next_signal
+                dirs = await self.get_current_directions(TIMEFRAMES if need_all else ("1m",))
+                background = {} if need_all else await self.background_directions(("5m", "30m"))
+                state.sar_directions = {**state.sar_directions, **background, **dirs}
                 if any(d is None for d in dirs.values()):
-                    time.sleep(5)
+                    await asyncio.sleep(self.seconds_to_next_tick())
                     continue
 
-                d1, d5, d30 = dirs["1m"], dirs["5m"], dirs["30m"]
-                logging.info(f"[{self.now()}] SAR: 1m={d1}, 5m={d5}, 30m={d30}")
+                d1 = dirs["1m"]
+                logging.info(f"[{self.now()}] SAR: 1m={d1}, 5m={state.sar_directions['5m']}, 30m={state.sar_directions['30m']}")
 
-                if state["in_position"]:
-                    if d1 != state["position"]["side"]:
-                        self.close_position(close_reason="sar_reversal")
-                        state["skip_next_signal"] = True
-                        self.save_state_to_file()
+                if state.in_position:
+                    if d1 != state.position["side"]:
+                        await self.close_position(close_reason="sar_reversal")
+                        state.skip_next_signal = True
+                        self.schedule_save()
                 else:
-                    if state["last_1m_dir"] and state["last_1m_dir"] != d1:
-                        state["skip_next_signal"] = False
-                    state["last_1m_dir"] = d1
-                    
-                    if d1 and d1 == d5 == d30 and not state["skip_next_signal"]:
-                        price = self.get_current_price()
-                        size, _ = self.compute_order_size_usdt(state["balance"], price)
-                        self.place_market_order("buy" if d1 == "long" else "sell", size)
-                        self.save_state_to_file()
-                
-                time.sleep(5)
+                    if state.last_1m_dir and state.last_1m_dir != d1 and state.skip_next_signal:
+                        state.skip_next_signal = False
+                        self.schedule_save()
+                    state.last_1m_dir = d1
+
+                    if not state.skip_next_signal and "5m" not in dirs:
+                        # Skip только что сброшен - досчитываем старшие таймфреймы в этом же тике
+                        dirs.update(await self.get_current_directions(("5m", "30m")))
+                        state.sar_directions = {**state.sar_directions, **dirs}
+                    d5, d30 = dirs.get("5m"), dirs.get("30m")
+
+                    if d1 and d1 == d5 == d30 and not state.skip_next_signal:
+                        # 1m свечи только что обновлены - их close и есть текущая цена
+                        price = await self.get_current_price()
+                        size, _ = self.compute_order_size_usdt(state.balance, price)
+                        if size > 0:
+                            await self.place_market_order("buy" if d1 == "long" else "sell", size)
+                            self.schedule_save()
+
+                ticks += 1
+                retry_delay = NETWORK_RETRY_SECONDS
+                if ticks % STATE_SAVE_EVERY_TICKS == 0:
+                    self.schedule_save()
+                notify_state_changed()
+                # Тик сразу после закрытия бара попадает в новый ключ кэша и забирает свечи целиком
+                await asyncio.sleep(self.seconds_to_next_tick())
+            except AuthenticationError as e:
+                # Повторы не помогут: останавливаем бота, а не долбим биржу отклонёнными запросами
+                logging.error(f"Exchange authentication failed, stopping strategy: {e}")
+                self.notify("error", f"Exchange authentication failed: {e}")
+                raise
+            except NetworkError as e:
+                logging.warning(f"Exchange unavailable, retrying in {retry_delay}s: {e}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, NETWORK_RETRY_MAX_SECONDS)
+            except Exception as e:
+                logging.error(f"Strategy loop error: {e}")
+                await asyncio.sleep(self.seconds_to_next_tick())